@@ -15,6 +15,8 @@
 # Lint as: python3
 """Utils to handle architectures in Phoenix."""
 
+import contextlib
+
 from model_search.architecture import architecture_utils
 import tensorflow.compat.v2 as tf
 
@@ -92,19 +94,25 @@ class Tower(tf.keras.Model):
       self._lengths = None
     else:
       input_tensor = self._input_tensor
-    tower_spec = architecture_utils.construct_tower(
-        phoenix_spec=self._phoenix_spec,
-        input_tensor=input_tensor,
-        tower_name=self._tower_name,
-        architecture=self._construct_architecture,
-        is_training=training,
-        lengths=self._lengths,
-        logits_dimension=self._logits_dimension,
-        is_frozen=self._is_frozen,
-        hparams=self._hparams,
-        model_directory=self._model_directory,
-        dropout_rate=self._dropout_rate,
-        allow_auxiliary_head=self._allow_auxiliary_head)
+    # jit_scope is only supported in graph mode.
+    if self._phoenix_spec.enable_xla and not tf.executing_eagerly():
+      scope = tf.xla.experimental.jit_scope(compile_ops=True)
+    else:
+      scope = contextlib.nullcontext()
+    with scope:
+      tower_spec = architecture_utils.construct_tower(
+          phoenix_spec=self._phoenix_spec,
+          input_tensor=input_tensor,
+          tower_name=self._tower_name,
+          architecture=self._construct_architecture,
+          is_training=training,
+          lengths=self._lengths,
+          logits_dimension=self._logits_dimension,
+          is_frozen=self._is_frozen,
+          hparams=self._hparams,
+          model_directory=self._model_directory,
+          dropout_rate=self._dropout_rate,
+          allow_auxiliary_head=self._allow_auxiliary_head)
     # Populate TowerSpec to Tower itself.
     self._logits_spec = tower_spec.logits_spec
     self._architecture = tower_spec.architecture
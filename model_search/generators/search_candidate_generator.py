@@ -31,52 +31,22 @@ from model_search.proto import transfer_learning_spec_pb2
 import numpy as np
 import tensorflow.compat.v2 as tf
 
+# Maps block type names to positions in _BLOCK_TYPE_VALUES, so that a list of
+# names can be converted to block type values with a single numpy gather.
+_BLOCK_TYPE_INDEX = {
+    name: i for i, name in enumerate(block_builder.BlockType.__members__)
+}
+_BLOCK_TYPE_VALUES = np.array(
+    [block_type.value for block_type in
+     block_builder.BlockType.__members__.values()],
+    dtype=np.int32)
 
 
-
-def _suggest_and_create_architecture(create_new_architecture_fn,
-                                     relevant_trials, hparams, my_id,
-                                     run_config, search_algorithm, phoenix_spec,
-                                     input_layer_fn, is_training,
-                                     logits_dimension, dropout_rate, aux):
-  """A function to suggest and create an archiecture.
-
-  Args:
-    create_new_architecture_fn: A function to create the architecture with the
-      following signature  Input architecture, A list of block encoding the
-      architecture. prev_trial, A trial if mutating a previous trial, otherwise
-      None. input_tensor, A tensor with the input. lengths, A tensor with the
-      lengths or None if non-sequential.  Output A list of
-      architecture_utils.TowerSpec, and a list of their architectures
-    relevant_trials: A list of past evaluated trials.
-    hparams: The hparams object for the model.
-    my_id: The currect trial id.
-    run_config: A tf.estimator.RunConfig for the training.
-    search_algorithm: A model_search.search.SearchAlgorithm
-    phoenix_spec: A PhoenixSpec proto.
-    input_layer_fn: A function with the following signature,  Input features, A
-      dict of the features. is_training, A boolean indicating if we are in
-      training mode. scope_name, A string with the scope name,
-      lengths_feature_name, A string holding the lengths feature name for
-      sequential problems, otherwise None.  Output Two tensors. One with the
-      input, and one for lengths for sequential problems (None if
-      non-sequential).
-    is_training: A boolean indicating if we are in training mode.
-    logits_dimension: An int specifying the cardinality of the logits.
-    dropout_rate: The dropout rate between blocks.
-    aux: A boolean indicating if we allow auxiliry head.
-
-  Returns:
-    A list of architecture_utils.TowerSpec, and a list of their architectures
-  """
-  architecture = None
-  input_tensor = None
-  lengths = None
-
-  architecture, prev_trial = search_algorithm.get_suggestion(
-      relevant_trials, hparams, my_id, run_config.model_dir)
-  return create_new_architecture_fn(
-      architecture=architecture, prev_trial=prev_trial)
+def _get_trial_ids(trials):
+  """Returns the ids of trials as an int64 array, in the order of trials."""
+  return np.fromiter((trial.id for trial in trials),
+                     dtype=np.int64,
+                     count=len(trials))
 
 
 class SearchCandidateGenerator(base_tower_generator.BaseTowerGenerator):
@@ -88,34 +58,70 @@ class SearchCandidateGenerator(base_tower_generator.BaseTowerGenerator):
         phoenix_spec=phoenix_spec, metadata=metadata)
     self._phoenix_spec = phoenix_spec
     self._max_depth = phoenix_spec.maximum_depth
-    search_algorithms = {
+    # Only the selected search algorithm is constructed.
+    search_algorithm_factories = {
         phoenix_spec_pb2.PhoenixSpec.NONADAPTIVE_RANDOM_SEARCH:
-            search.identity.Identity(phoenix_spec=phoenix_spec),
+            functools.partial(
+                search.identity.Identity, phoenix_spec=phoenix_spec),
         phoenix_spec_pb2.PhoenixSpec.ADAPTIVE_COORDINATE_DESCENT:
-            search.coordinate_descent.CoordinateDescent(
-                phoenix_spec=phoenix_spec, metadata=self._metadata),
+            functools.partial(
+                search.coordinate_descent.CoordinateDescent,
+                phoenix_spec=phoenix_spec,
+                metadata=self._metadata),
         phoenix_spec_pb2.PhoenixSpec.CONSTRAINED_ADAPTIVE_COORDINATE_DESCENT:
-            search.constrained_descent.ConstrainedDescent(
-                phoenix_spec=phoenix_spec, metadata=self._metadata),
+            functools.partial(
+                search.constrained_descent.ConstrainedDescent,
+                phoenix_spec=phoenix_spec,
+                metadata=self._metadata),
         phoenix_spec_pb2.PhoenixSpec.HARMONICA_SEARCH:
-            search.categorical_harmonica.Harmonica(phoenix_spec=phoenix_spec),
+            functools.partial(
+                search.categorical_harmonica.Harmonica,
+                phoenix_spec=phoenix_spec),
         phoenix_spec_pb2.PhoenixSpec.LINEAR_MODEL:
-            search.linear_model.LinearModel(phoenix_spec=phoenix_spec),
+            functools.partial(
+                search.linear_model.LinearModel, phoenix_spec=phoenix_spec),
     }
-    self._search_algorithm = search_algorithms[phoenix_spec.search_type]
+    self._search_algorithm = search_algorithm_factories[
+        phoenix_spec.search_type]()
     self._ensemble_spec = phoenix_spec.ensemble_spec
 
     # Overridden from parent.
     self._allow_auxiliary_head = True
 
-  def generator_name(self):
-    return "search_generator"
+    # The generator always builds a single tower, so its names are fixed.
+    self._generator_name = base_tower_generator.SEARCH_GENERATOR
+    self._tower_name = self._generator_name + "_0"
+    self._tower_scope = "Phoenix/" + self._tower_name
 
-  def _get_trial_from_id(self, trial_id, trials):
-    for trial in trials:
-      if trial.id == trial_id:
-        return trial
-    return None
+    # Latest checkpoint of previous trials used for snapshot transfer learning,
+    # keyed by trial directory.
+    self._checkpoint_cache = {}
+    # Number of towers this generator built in previous trials, keyed by trial
+    # directory.
+    self._number_of_towers_cache = {}
+    # Converted architectures of phoenix_spec.user_suggestions, by trial id.
+    self._user_suggestion_architectures = {}
+
+  def generator_name(self):
+    return self._generator_name
+
+  def _get_latest_checkpoint(self, trial_dir):
+    """Returns the latest checkpoint in trial_dir, resolved once per dir."""
+    checkpoint = self._checkpoint_cache.get(trial_dir)
+    if checkpoint is None:
+      checkpoint = tf.train.latest_checkpoint(trial_dir)
+      # Only cache found checkpoints, a missing one may still be written.
+      if checkpoint is not None:
+        self._checkpoint_cache[trial_dir] = checkpoint
+    return checkpoint
+
+  def _get_number_of_towers(self, model_dir):
+    """Returns the number of towers saved in model_dir, read once per dir."""
+    if model_dir not in self._number_of_towers_cache:
+      self._number_of_towers_cache[model_dir] = (
+          architecture_utils.get_number_of_towers(model_dir,
+                                                  self._generator_name))
+    return self._number_of_towers_cache[model_dir]
 
   def _create_new_architecture(self, architecture, run_config, my_id,
                                is_training, hparams, logits_dimension,
@@ -124,9 +130,11 @@ class SearchCandidateGenerator(base_tower_generator.BaseTowerGenerator):
     logging.info(architecture)
 
     self._save_architecture(architecture, run_config.model_dir, my_id)
+    # Not cached across trials: each model_fn call builds a new graph, and the
+    # tower's variables belong to the graph it is built in.
     tower_ = tower.Tower(
         phoenix_spec=self._phoenix_spec,
-        tower_name=self.generator_name() + "_0",
+        tower_name=self._tower_name,
         architecture=architecture,
         is_training=is_training,
         logits_dimension=logits_dimension,
@@ -141,59 +149,69 @@ class SearchCandidateGenerator(base_tower_generator.BaseTowerGenerator):
         transfer_learning_spec_pb2.TransferLearningSpec
         .SNAPSHOT_TRANSFER_LEARNING)
     if prev_trial and prev_trial > 0 and apply_snapshot:
+      # Only this branch needs the previous trial, so look it up here and stop
+      # at the first match.
+      previous_trial = next(
+          (trial for trial in trials if trial.id == prev_trial), None)
+      prev_trial_dir = architecture_utils.DirectoryHandler.trial_dir(
+          previous_trial)
       architecture_utils.init_variables(
-          checkpoint=tf.train.latest_checkpoint(
-              architecture_utils.DirectoryHandler.trial_dir(
-                  self._get_trial_from_id(prev_trial, trials))),
-          original_scope="Phoenix/{}_0".format(self.generator_name()),
-          new_scope="Phoenix/{}_0".format(self.generator_name()))
+          checkpoint=self._get_latest_checkpoint(prev_trial_dir),
+          original_scope=self._tower_scope,
+          new_scope=self._tower_scope)
 
-    architecture_utils.set_number_of_towers(self.generator_name(), 1)
+    architecture_utils.set_number_of_towers(self._generator_name, 1)
     return [tower_]
 
-  def _get_user_suggestion(self, trial_id):
-    suggestion = trial_id - 1
-    architecture = self._phoenix_spec.user_suggestions[suggestion].architecture
-    architecture = [
-        block_builder.BlockType[block_type] for block_type in architecture
-    ]
+  def _convert_user_suggestion(self, suggestion):
+    architecture = suggestion.architecture
+    indices = np.fromiter(
+        (_BLOCK_TYPE_INDEX[block_type] for block_type in architecture),
+        dtype=np.int32,
+        count=len(architecture))
     return np.array(
         architecture_utils.fix_architecture_order(
-            architecture, self._phoenix_spec.problem_type))
+            _BLOCK_TYPE_VALUES[indices], self._phoenix_spec.problem_type))
+
+  def _get_user_suggestion(self, trial_id):
+    # User suggestions can be added to the spec after construction, so each one
+    # is converted on first use rather than in __init__.
+    architecture = self._user_suggestion_architectures.get(trial_id)
+    if architecture is None:
+      architecture = self._convert_user_suggestion(
+          self._phoenix_spec.user_suggestions[trial_id - 1])
+      self._user_suggestion_architectures[trial_id] = architecture
+    return architecture
 
   def first_time_chief_generate(self, input_layer_fn, trial_mode,
                                 logits_dimension, hparams, run_config,
                                 is_training, trials):
+    del input_layer_fn
     dropout_rate = getattr(hparams, "dropout_rate", None)
     my_id = architecture_utils.DirectoryHandler.get_trial_id(
         run_config.model_dir, self._phoenix_spec)
-    create_new_architecture_fn = functools.partial(
-        self._create_new_architecture,
-        run_config=run_config,
-        my_id=my_id,
-        hparams=hparams,
-        is_training=is_training,
-        logits_dimension=logits_dimension,
-        dropout_rate=dropout_rate,
-        trials=trials)
 
-    suggest_and_create_architecture_fn = functools.partial(
-        _suggest_and_create_architecture,
-        create_new_architecture_fn=create_new_architecture_fn,
-        hparams=hparams,
-        my_id=my_id,
-        run_config=run_config,
-        search_algorithm=self._search_algorithm,
-        phoenix_spec=self._phoenix_spec,
-        input_layer_fn=input_layer_fn,
-        is_training=is_training,
-        logits_dimension=logits_dimension,
-        dropout_rate=dropout_rate,
-        aux=self._allow_auxiliary_head)
+    def create_new_architecture(architecture, prev_trial):
+      return self._create_new_architecture(
+          architecture=architecture,
+          run_config=run_config,
+          my_id=my_id,
+          hparams=hparams,
+          is_training=is_training,
+          logits_dimension=logits_dimension,
+          dropout_rate=dropout_rate,
+          prev_trial=prev_trial,
+          trials=trials)
+
+    def suggest_and_create_architecture(relevant_trials):
+      architecture, prev_trial = self._search_algorithm.get_suggestion(
+          relevant_trials, hparams, my_id, run_config.model_dir)
+      return create_new_architecture(
+          architecture=architecture, prev_trial=prev_trial)
 
     # First, try out user suggestions.
     if my_id <= len(self._phoenix_spec.user_suggestions):
-      return create_new_architecture_fn(
+      return create_new_architecture(
           architecture=self._get_user_suggestion(my_id), prev_trial=-1)
 
     if trial_mode == trial_utils.TrialMode.ENSEMBLE_SEARCH:
@@ -201,7 +219,7 @@ class SearchCandidateGenerator(base_tower_generator.BaseTowerGenerator):
       # Non-adaptive ensemble search.
       if trial_utils.is_nonadaptive_ensemble_search(self._ensemble_spec):
         # Done searching if we've hit critical mass.
-        architecture_utils.set_number_of_towers(self.generator_name(), 0)
+        architecture_utils.set_number_of_towers(self._generator_name, 0)
         return [], []
 
       # Adaptive and residual ensemble search.
@@ -210,10 +228,9 @@ class SearchCandidateGenerator(base_tower_generator.BaseTowerGenerator):
         every = self._ensemble_spec.adaptive_search.increase_width_every
         relevant_trials = trials
         if every:
-          relevant_trials = [
-              trial for trial in trials if trial.id >= my_id // every * every
-          ]
-        return suggest_and_create_architecture_fn(
+          mask = _get_trial_ids(trials) >= my_id // every * every
+          relevant_trials = [trials[i] for i in np.flatnonzero(mask)]
+        return suggest_and_create_architecture(
             relevant_trials=relevant_trials)
 
       # Intermixed ensemble search.
@@ -222,12 +239,13 @@ class SearchCandidateGenerator(base_tower_generator.BaseTowerGenerator):
 
         # Do not search if this is a non-exploration trial.
         if my_id % every == 0:
-          architecture_utils.set_number_of_towers(self.generator_name(), 0)
+          architecture_utils.set_number_of_towers(self._generator_name, 0)
           return [], []
 
         # Search if this is an exploration trial.
-        relevant_trials = [trial for trial in trials if trial.id % every != 0]
-        return suggest_and_create_architecture_fn(
+        mask = _get_trial_ids(trials) % every != 0
+        relevant_trials = [trials[i] for i in np.flatnonzero(mask)]
+        return suggest_and_create_architecture(
             relevant_trials=relevant_trials)
 
       else:
@@ -242,24 +260,22 @@ class SearchCandidateGenerator(base_tower_generator.BaseTowerGenerator):
       best_trial = self._metadata.get_best_k(trials=relevant_trials, k=1)
       if best_trial is not None:
         model_dir = architecture_utils.DirectoryHandler.trial_dir(best_trial)
-        assert architecture_utils.get_number_of_towers(
-            model_dir, self.generator_name()) == 1
-        tower_name = self.generator_name() + "_0"
+        assert self._get_number_of_towers(model_dir) == 1
         tower_ = tower.Tower.load(
             phoenix_spec=self._phoenix_spec,
-            original_tower_name=tower_name,
-            new_tower_name=tower_name,
+            original_tower_name=self._tower_name,
+            new_tower_name=self._tower_name,
             model_directory=model_dir,
             new_model_directory=run_config.model_dir,
             is_training=is_training,
             logits_dimension=logits_dimension,
             force_freeze=False,
             allow_auxiliary_head=self._allow_auxiliary_head)
-        architecture_utils.set_number_of_towers(self.generator_name(), 1)
+        architecture_utils.set_number_of_towers(self._generator_name, 1)
         return [tower_]
 
     # If no ensembling search method is specified, or this is a distillation
     # trial without intermixed ensemble_search, get a new tower based on the
     # architecture search algorithm.
     # This will serve as the student model if distillation occurs on this trial.
-    return suggest_and_create_architecture_fn(relevant_trials=trials)
+    return suggest_and_create_architecture(relevant_trials=trials)
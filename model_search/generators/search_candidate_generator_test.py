@@ -23,6 +23,7 @@ import collections
 import os
 
 from absl import flags
+from absl.testing import parameterized
 
 from model_search import hparam as hp
 from model_search.architecture import architecture_utils
@@ -120,7 +121,7 @@ _DISTILLATION_GRAPH_NODE_SUBSET = [
 ]
 
 
-class SearchCandidateGeneratorTest(tf.test.TestCase):
+class SearchCandidateGeneratorTest(parameterized.TestCase, tf.test.TestCase):
 
   def _create_checkpoint(self, towers, trial_id):
     with self.test_session(graph=tf.Graph()) as sess:
@@ -151,13 +152,22 @@ class SearchCandidateGeneratorTest(tf.test.TestCase):
       sess.run(tf.compat.v1.local_variables_initializer())
       saver.save(sess, os.path.join(directory, str(trial_id)) + '/ckpt')
 
-  def test_generator(self):
+  @parameterized.named_parameters(
+      {
+          'testcase_name': 'no_xla',
+          'enable_xla': False
+      }, {
+          'testcase_name': 'xla',
+          'enable_xla': True
+      })
+  def test_generator(self, enable_xla):
     # Force graph mode
     with tf.compat.v1.Graph().as_default():
       spec = phoenix_spec_pb2.PhoenixSpec(
           problem_type=phoenix_spec_pb2.PhoenixSpec.DNN)
       spec.search_type = phoenix_spec_pb2.PhoenixSpec.NONADAPTIVE_RANDOM_SEARCH
       spec.is_input_shared = True
+      spec.enable_xla = enable_xla
       generator = search_candidate_generator.SearchCandidateGenerator(
           phoenix_spec=spec,
           metadata=ml_metadata_db.MLMetaData(
@@ -175,14 +185,26 @@ class SearchCandidateGeneratorTest(tf.test.TestCase):
           run_config=run_config,
           is_training=True,
           trials=[])
-      for t in towers:
-        t(input_tensor, training=True)
-      all_nodes = [
-          node.name
-          for node in tf.compat.v1.get_default_graph().as_graph_def().node
-      ]
+      logits = [t(input_tensor, training=True) for t in towers]
+      graph_def = tf.compat.v1.get_default_graph().as_graph_def()
+      all_nodes = [node.name for node in graph_def.node]
 
       self.assertAllInSet(_FIRST_GRAPH_NODE_SUBSET, all_nodes)
+      xla_nodes = [
+          node.name for node in graph_def.node if '_XlaCompile' in node.attr
+      ]
+      if enable_xla:
+        self.assertNotEmpty(xla_nodes)
+      else:
+        self.assertEmpty(xla_nodes)
+
+      # The towers, including their variable initializers, must still run.
+      self.assertLen(logits, 1)
+      with tf.compat.v1.Session() as sess:
+        sess.run(tf.compat.v1.global_variables_initializer())
+        sess.run(tf.compat.v1.local_variables_initializer())
+        for tower_logits in sess.run(logits):
+          self.assertEqual(tower_logits.shape, (20, 10))
 
   def test_generator_with_suggestions(self):
     # Force graph mode
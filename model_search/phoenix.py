@@ -82,13 +82,15 @@ def _default_predictions_fn(logits,
   new_logits = logits
   if mode == tf.estimator.ModeKeys.PREDICT and temperature != 1.0:
     assert temperature > 0
-    temp_const = tf.constant(1 / temperature, name="softmax_temperature_const")
     logging.info("Applying temperature to logits")
-    new_logits = tf.multiply(logits, temp_const, name="softmax_temperature_mul")
+    new_logits = tf.multiply(
+        logits, 1.0 / temperature, name="softmax_temperature_mul")
 
   predictions = tf.math.argmax(input=new_logits, axis=-1)
-  probabilities = tf.nn.softmax(new_logits)
+  # Derive the probabilities from the log probabilities, so the softmax
+  # normalization is only computed once.
   log_probabilities = tf.nn.log_softmax(new_logits)
+  probabilities = tf.exp(log_probabilities)
 
   predictions_dict = {
       "predictions": predictions,
@@ -14,6 +14,10 @@
 """Tests for model_search.task_manager."""
 
 import collections
+import shutil
+import tempfile
+
+from absl.testing import absltest
 from absl.testing import parameterized
 
 from model_search import hparam as hp
@@ -23,10 +27,20 @@ from model_search.architecture import architecture_utils
 from model_search.generators import trial_utils
 from model_search.proto import phoenix_spec_pb2
 import numpy as np
-import tensorflow.compat.v2 as tf
+import tensorflow as tf
 
 from google.protobuf import text_format
 
+_TRAIN = tf.estimator.ModeKeys.TRAIN
+_EVAL = tf.estimator.ModeKeys.EVAL
+_PREDICT = tf.estimator.ModeKeys.PREDICT
+_NO_PRIOR = trial_utils.TrialMode.NO_PRIOR
+
+_FakeTower = collections.namedtuple('fake_tower',
+                                    ['logits_spec', 'previous_model_dir'])
+
+_MULTI_CLASS_LOSS_FN = loss_fns.make_multi_class_loss_fn()
+
 
 def _loss_fn(labels, logits, weights=1.0):
   """Cross entropy loss fn."""
@@ -42,18 +56,18 @@ def _loss_fn(labels, logits, weights=1.0):
           onehot_labels=one_hot_labels, logits=logits, weights=weights))
 
 
-def _default_predictions_fn(logits,
-                            mode=tf.estimator.ModeKeys.TRAIN,
-                            temperature=1.0):
+def _default_predictions_fn(logits, mode=_TRAIN, temperature=1.0):
   """Converts logits to predictions dict. Assumes classification."""
   new_logits = logits
-  if mode == tf.estimator.ModeKeys.PREDICT and temperature != 1.0:
-    temp_const = tf.constant(1 / temperature, name='softmax_temperature_const')
-    new_logits = tf.multiply(logits, temp_const, name='softmax_temperature_mul')
+  if mode == _PREDICT and temperature != 1.0:
+    new_logits = tf.multiply(
+        logits, 1.0 / temperature, name='softmax_temperature_mul')
 
   predictions = tf.math.argmax(input=new_logits, axis=-1)
-  probabilities = tf.nn.softmax(new_logits)
+  # Derive the probabilities from the log probabilities, so the softmax
+  # normalization is only computed once.
   log_probabilities = tf.nn.log_softmax(new_logits)
+  probabilities = tf.exp(log_probabilities)
 
   predictions_dict = {
       'predictions': predictions,
@@ -63,246 +77,200 @@ def _default_predictions_fn(logits,
   return predictions_dict
 
 
+def _graph_node_names():
+  """Returns the node names of the default graph, one per line."""
+  return '\n'.join(
+      op.name for op in tf.compat.v1.get_default_graph().get_operations())
+
+
+# Learning rate specs, each with a node that only it adds to a training graph.
+_LEARNING_RATE_CASES = (
+    ('l2_reg', {
+        'learning_rate': 0.001,
+        'l2_regularization': 0.01
+    }, 'l2_weight_loss'),
+    ('clipping', {
+        'learning_rate': 0.001,
+        'gradient_max_norm': 3
+    }, 'clip_by_global_norm'),
+    ('decay', {
+        'learning_rate': 0.001,
+        'exponential_decay_steps': 100,
+        'exponential_decay_rate': 0.7
+    }, 'ExponentialDecay'),
+)
+
+_LEARNING_RATE_NODES = [node for _, _, node in _LEARNING_RATE_CASES]
+
+_MULTITASK_SPEC = """
+    multi_task_spec {
+      label_name: "label1"
+      number_of_classes: 2
+    }
+
+    multi_task_spec {
+      label_name: "label2"
+      number_of_classes: 2
+    }
+"""
+
+_WEIGHTED_MULTITASK_SPEC = """
+    multi_task_spec {
+      label_name: "label1"
+      number_of_classes: 2
+      weight_feature_name: "weight1"
+      weight_is_a_feature: %s
+    }
+    multi_task_spec {
+      label_name: "label2"
+      number_of_classes: 2
+      weight_feature_name: "weight2"
+      weight_is_a_feature: %s
+    }
+"""
+
+
+def _parse_dnn_spec(text):
+  return text_format.Merge(
+      text,
+      phoenix_spec_pb2.PhoenixSpec(
+          problem_type=phoenix_spec_pb2.PhoenixSpec.DNN))
+
+
 class TaskManagerTest(parameterized.TestCase, tf.test.TestCase):
 
-  @parameterized.named_parameters(
-      {
-          'testcase_name': 'l2_reg',
-          'learning_rate_spec': {
-              'learning_rate': 0.001,
-              'l2_regularization': 0.01
-          },
-          'contains_node': 'l2_weight_loss',
-          'not_containing': ['clip_by_global_norm', 'ExponentialDecay']
-      }, {
-          'testcase_name': 'clipping',
-          'learning_rate_spec': {
-              'learning_rate': 0.001,
-              'gradient_max_norm': 3
-          },
-          'contains_node': 'clip_by_global_norm',
-          'not_containing': ['l2_weight_loss', 'ExponentialDecay']
-      }, {
-          'testcase_name': 'decay',
-          'learning_rate_spec': {
-              'learning_rate': 0.001,
-              'exponential_decay_steps': 100,
-              'exponential_decay_rate': 0.7
-          },
-          'contains_node': 'ExponentialDecay',
-          'not_containing': ['l2_weight_loss', 'clip_by_global_norm']
-      })
-  def test_learning_spec(self, learning_rate_spec, contains_node,
-                         not_containing):
-    # Force graph mode
-    with tf.compat.v1.Graph().as_default():
-      spec = phoenix_spec_pb2.PhoenixSpec(
-          problem_type=phoenix_spec_pb2.PhoenixSpec.DNN)
-      task_manager_instance = task_manager.TaskManager(
-          spec,
-          logits_dimension=None,
-          loss_fn=loss_fns.make_multi_class_loss_fn(),
-          head=None)
-      logits = tf.keras.layers.Dense(10)(tf.zeros([20, 10]))
-      logits_spec = architecture_utils.LogitsSpec(logits=logits)
-      fake_tower = collections.namedtuple('fake_tower', ['logits_spec'])
-      towers = {'search_generator': [fake_tower(logits_spec)]}
-      features = {'x': tf.zeros([10, 10])}
-      model = task_manager_instance.create_model_spec(
-          features=features,
-          params=hp.HParams(optimizer='sgd'),
-          learning_rate_spec=learning_rate_spec,
-          towers=towers,
-          labels=tf.ones([20], dtype=tf.int32),
-          mode=tf.estimator.ModeKeys.TRAIN,
-          trial_mode=trial_utils.TrialMode.NO_PRIOR,
-          my_id=1,
-          model_directory=self.get_temp_dir(),
-          use_tpu=False,
-          predictions_fn=_default_predictions_fn)
-      self.assertNotEmpty([
-          node.name
-          for node in tf.compat.v1.get_default_graph().as_graph_def().node
-          if contains_node in node.name
-      ])
-      for phrase in not_containing:
-        self.assertEmpty([
-            node.name
-            for node in tf.compat.v1.get_default_graph().as_graph_def().node
-            if phrase in node.name
-        ])
-      self.assertLen(model.predictions, 3)
-      self.assertIn('probabilities', model.predictions)
-      self.assertIn('log_probabilities', model.predictions)
-      self.assertIn('predictions', model.predictions)
+  @classmethod
+  def setUpClass(cls):
+    super(TaskManagerTest, cls).setUpClass()
+    # No test writes checkpoints, so all of them can share one model directory.
+    cls._model_directory = tempfile.mkdtemp(
+        dir=absltest.get_default_test_tmpdir())
+    # Specs shared by parameterized cases are parsed once and copied per case.
+    cls._multitask_spec = _parse_dnn_spec(_MULTITASK_SPEC)
+    cls._weighted_multitask_specs = {
+        is_feature: _parse_dnn_spec(
+            _WEIGHTED_MULTITASK_SPEC % (is_feature, is_feature))
+        for is_feature in (False, True)
+    }
 
-  @parameterized.named_parameters(
-      {
-          'testcase_name':
-              'l2_reg',
-          'learning_rate_spec': {
-              'learning_rate': 0.001,
-              'l2_regularization': 0.01
-          },
-          'not_containing':
-              ['l2_weight_loss', 'clip_by_global_norm', 'ExponentialDecay']
-      }, {
-          'testcase_name':
-              'clipping',
-          'learning_rate_spec': {
-              'learning_rate': 0.001,
-              'gradient_max_norm': 3
-          },
-          'not_containing':
-              ['l2_weight_loss', 'clip_by_global_norm', 'ExponentialDecay']
-      }, {
-          'testcase_name':
-              'decay',
-          'learning_rate_spec': {
-              'learning_rate': 0.001,
-              'exponential_decay_steps': 100,
-              'exponential_decay_rate': 0.7
-          },
-          'not_containing':
-              ['l2_weight_loss', 'clip_by_global_norm', 'ExponentialDecay']
-      })
-  def test_learning_spec_on_eval(self, learning_rate_spec, not_containing):
-    spec = phoenix_spec_pb2.PhoenixSpec(
-        problem_type=phoenix_spec_pb2.PhoenixSpec.DNN)
+  @classmethod
+  def tearDownClass(cls):
+    shutil.rmtree(cls._model_directory, ignore_errors=True)
+    super(TaskManagerTest, cls).tearDownClass()
+
+  def setUp(self):
+    super(TaskManagerTest, self).setUp()
+    # Every test builds its model in graph mode, in a fresh graph.
+    self._graph = tf.compat.v1.Graph()
+    self._graph_context = self._graph.as_default()
+    self._graph_context.__enter__()
+    self.addCleanup(self._graph_context.__exit__, None, None, None)
+
+  def _create_model_spec(self,
+                         spec,
+                         learning_rate_spec,
+                         mode=_TRAIN,
+                         labels=None,
+                         features=None,
+                         loss_fn=_MULTI_CLASS_LOSS_FN,
+                         predictions_fn=_default_predictions_fn,
+                         use_tpu=False):
+    """Creates the model spec of a TaskManager over a single fake tower."""
+    if labels is None:
+      labels = tf.ones([2], dtype=tf.int32)
+    if features is None:
+      features = {'x': tf.zeros([2, 2])}
     task_manager_instance = task_manager.TaskManager(
-        spec,
-        logits_dimension=None,
-        loss_fn=loss_fns.make_multi_class_loss_fn(),
-        head=None)
-    logits = tf.keras.layers.Dense(10)(tf.zeros([20, 10]))
+        spec, logits_dimension=None, loss_fn=loss_fn, head=None)
+    logits = tf.keras.layers.Dense(2)(tf.zeros([2, 2]))
     logits_spec = architecture_utils.LogitsSpec(logits=logits)
-    fake_tower = collections.namedtuple('fake_tower', ['logits_spec'])
-    towers = {'search_generator': [fake_tower(logits_spec)]}
-    features = {'x': tf.zeros([10, 10])}
-    model = task_manager_instance.create_model_spec(
+    towers = {'search_generator': [_FakeTower(logits_spec, None)]}
+    return task_manager_instance.create_model_spec(
         features=features,
         params=hp.HParams(optimizer='sgd'),
         learning_rate_spec=learning_rate_spec,
         towers=towers,
-        labels=tf.ones([20], dtype=tf.int32),
-        model_directory=self.get_temp_dir(),
-        mode=tf.estimator.ModeKeys.EVAL,
+        labels=labels,
+        mode=mode,
+        trial_mode=_NO_PRIOR,
         my_id=1,
-        trial_mode=trial_utils.TrialMode.NO_PRIOR,
-        use_tpu=False,
-        predictions_fn=_default_predictions_fn)
-    for phrase in not_containing:
-      self.assertEmpty([
-          node.name
-          for node in tf.compat.v1.get_default_graph().as_graph_def().node
-          if phrase in node.name
-      ])
-    self.assertLen(model.predictions, 3)
-    self.assertIn('probabilities', model.predictions)
-    self.assertIn('log_probabilities', model.predictions)
-    self.assertIn('predictions', model.predictions)
-    self.assertNotEqual(model.loss, None)
+        model_directory=self._model_directory,
+        use_tpu=use_tpu,
+        predictions_fn=predictions_fn)
 
-  @parameterized.named_parameters(
-      {
-          'testcase_name':
-              'l2_reg',
-          'learning_rate_spec': {
-              'learning_rate': 0.001,
-              'l2_regularization': 0.01
-          },
-          'not_containing':
-              ['l2_weight_loss', 'clip_by_global_norm', 'ExponentialDecay']
-      }, {
-          'testcase_name':
-              'clipping',
-          'learning_rate_spec': {
-              'learning_rate': 0.001,
-              'gradient_max_norm': 3
-          },
-          'not_containing':
-              ['l2_weight_loss', 'clip_by_global_norm', 'ExponentialDecay']
-      }, {
-          'testcase_name':
-              'decay',
-          'learning_rate_spec': {
-              'learning_rate': 0.001,
-              'exponential_decay_steps': 100,
-              'exponential_decay_rate': 0.7
-          },
-          'not_containing':
-              ['l2_weight_loss', 'clip_by_global_norm', 'ExponentialDecay']
-      })
-  def test_learning_spec_on_predict(self, learning_rate_spec, not_containing):
+  # assertIn/assertNotIn would print every node name on failure, so these only
+  # report the phrase and the case, which defaults to the test id.
+  def _assert_node_in(self, phrase, node_names, case=None):
+    self.assertTrue(
+        phrase in node_names,
+        msg='No node contains {!r} in {}'.format(phrase, case or self.id()))
+
+  def _assert_node_not_in(self, phrase, node_names, case=None):
+    self.assertFalse(
+        phrase in node_names,
+        msg='A node contains {!r} in {}'.format(phrase, case or self.id()))
+
+  def _create_learning_rate_model_specs(self, mode):
+    """Returns the model spec and node names of each case, one graph each."""
     spec = phoenix_spec_pb2.PhoenixSpec(
         problem_type=phoenix_spec_pb2.PhoenixSpec.DNN)
-    task_manager_instance = task_manager.TaskManager(
-        spec,
-        logits_dimension=None,
-        loss_fn=loss_fns.make_multi_class_loss_fn(),
-        head=None)
-    logits = tf.keras.layers.Dense(10)(tf.zeros([20, 10]))
-    logits_spec = architecture_utils.LogitsSpec(logits=logits)
-    fake_tower = collections.namedtuple('fake_tower', ['logits_spec'])
-    towers = {'search_generator': [fake_tower(logits_spec)]}
-    features = {'x': tf.zeros([10, 10])}
-    model = task_manager_instance.create_model_spec(
-        features=features,
-        params=hp.HParams(optimizer='sgd'),
-        learning_rate_spec=learning_rate_spec,
-        towers=towers,
-        labels=tf.ones([20], dtype=tf.int32),
-        mode=tf.estimator.ModeKeys.PREDICT,
-        model_directory=self.get_temp_dir(),
-        use_tpu=False,
-        my_id=1,
-        trial_mode=trial_utils.TrialMode.NO_PRIOR,
-        predictions_fn=_default_predictions_fn)
-    for phrase in not_containing:
-      self.assertEmpty([
-          node.name
-          for node in tf.compat.v1.get_default_graph().as_graph_def().node
-          if phrase in node.name
-      ])
-    self.assertLen(model.predictions, 3)
-    self.assertIn('probabilities', model.predictions)
-    self.assertIn('log_probabilities', model.predictions)
-    self.assertIn('predictions', model.predictions)
-    self.assertIsNone(model.loss)
+    models = {}
+    for case_name, learning_rate_spec, _ in _LEARNING_RATE_CASES:
+      # A graph per case, so that the graph-wide trainable variables regularized
+      # and clipped by the train op are only those of the case.
+      with tf.compat.v1.Graph().as_default():
+        model = self._create_model_spec(spec, learning_rate_spec, mode=mode)
+        models[case_name] = (model, _graph_node_names())
+    return models
+
+  def test_learning_spec(self):
+    models = self._create_learning_rate_model_specs(_TRAIN)
+    for case_name, _, contains_node in _LEARNING_RATE_CASES:
+      with self.subTest(case_name):
+        model, node_names = models[case_name]
+        self._assert_node_in(contains_node, node_names, case_name)
+        for phrase in _LEARNING_RATE_NODES:
+          if phrase != contains_node:
+            self._assert_node_not_in(phrase, node_names, case_name)
+        self.assertLen(model.predictions, 3)
+        self.assertIn('probabilities', model.predictions)
+        self.assertIn('log_probabilities', model.predictions)
+        self.assertIn('predictions', model.predictions)
+
+  def test_learning_spec_on_eval(self):
+    models = self._create_learning_rate_model_specs(_EVAL)
+    for case_name, _, _ in _LEARNING_RATE_CASES:
+      with self.subTest(case_name):
+        model, node_names = models[case_name]
+        self.assertNotEmpty(node_names)
+        for phrase in _LEARNING_RATE_NODES:
+          self._assert_node_not_in(phrase, node_names, case_name)
+        self.assertLen(model.predictions, 3)
+        self.assertIn('probabilities', model.predictions)
+        self.assertIn('log_probabilities', model.predictions)
+        self.assertIn('predictions', model.predictions)
+        self.assertNotEqual(model.loss, None)
+
+  def test_learning_spec_on_predict(self):
+    models = self._create_learning_rate_model_specs(_PREDICT)
+    for case_name, _, _ in _LEARNING_RATE_CASES:
+      with self.subTest(case_name):
+        model, node_names = models[case_name]
+        self.assertNotEmpty(node_names)
+        for phrase in _LEARNING_RATE_NODES:
+          self._assert_node_not_in(phrase, node_names, case_name)
+        self.assertLen(model.predictions, 3)
+        self.assertIn('probabilities', model.predictions)
+        self.assertIn('log_probabilities', model.predictions)
+        self.assertIn('predictions', model.predictions)
+        self.assertIsNone(model.loss)
 
   def test_tpu(self):
-    # Force graph mode
-    with tf.compat.v1.Graph().as_default():
-      learning_rate_spec = {'learning_rate': 0.001, 'gradient_max_norm': 3}
-      spec = phoenix_spec_pb2.PhoenixSpec(
-          problem_type=phoenix_spec_pb2.PhoenixSpec.DNN)
-      task_manager_instance = task_manager.TaskManager(
-          spec,
-          logits_dimension=None,
-          loss_fn=loss_fns.make_multi_class_loss_fn(),
-          head=None)
-      logits = tf.keras.layers.Dense(10)(tf.zeros([20, 10]))
-      logits_spec = architecture_utils.LogitsSpec(logits=logits)
-      fake_tower = collections.namedtuple('fake_tower', ['logits_spec'])
-      towers = {'search_generator': [fake_tower(logits_spec)]}
-      features = {'x': tf.zeros([10, 10])}
-      _ = task_manager_instance.create_model_spec(
-          features=features,
-          params=hp.HParams(optimizer='sgd'),
-          learning_rate_spec=learning_rate_spec,
-          towers=towers,
-          labels=tf.ones([20], dtype=tf.int32),
-          model_directory=self.get_temp_dir(),
-          mode=tf.estimator.ModeKeys.TRAIN,
-          my_id=1,
-          trial_mode=trial_utils.TrialMode.NO_PRIOR,
-          use_tpu=True,
-          predictions_fn=_default_predictions_fn)
-      self.assertNotEmpty([
-          node.name
-          for node in tf.compat.v1.get_default_graph().as_graph_def().node
-          if 'CrossReplicaSum' in node.name
-      ])
+    learning_rate_spec = {'learning_rate': 0.001, 'gradient_max_norm': 3}
+    spec = phoenix_spec_pb2.PhoenixSpec(
+        problem_type=phoenix_spec_pb2.PhoenixSpec.DNN)
+    _ = self._create_model_spec(spec, learning_rate_spec, use_tpu=True)
+    self._assert_node_in('CrossReplicaSum', _graph_node_names())
 
   @parameterized.named_parameters(
       {
@@ -419,81 +387,46 @@ class TaskManagerTest(parameterized.TestCase, tf.test.TestCase):
                      multi_loss=False,
                      multi_prediction=False,
                      merge_losses=False):
-    # Force graph mode
-    with tf.compat.v1.Graph().as_default():
-      spec = phoenix_spec_pb2.PhoenixSpec(
-          problem_type=phoenix_spec_pb2.PhoenixSpec.DNN)
-      text_format.Merge(
-          """
-          multi_task_spec {
-            label_name: "label1"
-            number_of_classes: 10
-          }
-
-          multi_task_spec {
-            label_name: "label2"
-            number_of_classes: 10
-          }
-      """, spec)
-      spec.merge_losses_of_multitask = merge_losses
-      loss_fn = loss_fns.make_multi_class_loss_fn()
-      if multi_loss:
-        loss_fn = {
-            'label1': loss_fns.make_multi_class_loss_fn(),
-            'label2': loss_fns.make_multi_class_loss_fn()
-        }
-      task_manager_instance = task_manager.TaskManager(
-          spec, logits_dimension=None, loss_fn=loss_fn, head=None)
-      logits = tf.keras.layers.Dense(10)(tf.zeros([20, 10]))
-      logits_spec = architecture_utils.LogitsSpec(logits=logits)
-      fake_tower = collections.namedtuple('fake_tower',
-                                          ['logits_spec', 'previous_model_dir'])
-      towers = {'search_generator': [fake_tower(logits_spec, None)]}
-      features = {'x': tf.zeros([10, 10])}
-      prediction_fn = _default_predictions_fn
-      if multi_prediction:
-        prediction_fn = {
-            'label1': _default_predictions_fn,
-            'label2': _default_predictions_fn
-        }
-      model = task_manager_instance.create_model_spec(
-          features=features,
-          params=hp.HParams(optimizer='sgd'),
-          learning_rate_spec=learning_rate_spec,
-          towers=towers,
-          labels={
-              'label1': tf.ones([20], dtype=tf.int32),
-              'label2': tf.ones([20], dtype=tf.int32)
-          },
-          my_id=1,
-          model_directory=self.get_temp_dir(),
-          mode=tf.estimator.ModeKeys.TRAIN,
-          trial_mode=trial_utils.TrialMode.NO_PRIOR,
-          use_tpu=False,
-          predictions_fn=prediction_fn)
-      self.assertNotEmpty([
-          node.name
-          for node in tf.compat.v1.get_default_graph().as_graph_def().node
-          if contains_node in node.name
-      ])
-      for phrase in not_containing:
-        self.assertEmpty([
-            node.name
-            for node in tf.compat.v1.get_default_graph().as_graph_def().node
-            if phrase in node.name
-        ])
-      self.assertLen(model.predictions, 3 * (1 + 2))
-      self.assertContainsSubset([
-          'probabilities',
-          'probabilities/label1',
-          'probabilities/label2',
-          'log_probabilities',
-          'log_probabilities/label1',
-          'log_probabilities/label2',
-          'predictions',
-          'predictions/label1',
-          'predictions/label2',
-      ], model.predictions.keys())
+    spec = phoenix_spec_pb2.PhoenixSpec()
+    spec.CopyFrom(self._multitask_spec)
+    spec.merge_losses_of_multitask = merge_losses
+    loss_fn = _MULTI_CLASS_LOSS_FN
+    if multi_loss:
+      loss_fn = {
+          'label1': _MULTI_CLASS_LOSS_FN,
+          'label2': _MULTI_CLASS_LOSS_FN
+      }
+    prediction_fn = _default_predictions_fn
+    if multi_prediction:
+      prediction_fn = {
+          'label1': _default_predictions_fn,
+          'label2': _default_predictions_fn
+      }
+    model = self._create_model_spec(
+        spec,
+        learning_rate_spec,
+        labels={
+            'label1': tf.ones([2], dtype=tf.int32),
+            'label2': tf.ones([2], dtype=tf.int32)
+        },
+        loss_fn=loss_fn,
+        predictions_fn=prediction_fn)
+    node_names = _graph_node_names()
+    self._assert_node_in(contains_node, node_names)
+    for phrase in not_containing:
+      self._assert_node_not_in(phrase, node_names)
+    self.assertLen(model.predictions, 3 * (1 + 2))
+    self.assertContainsSubset([
+        'probabilities',
+        'probabilities/label1',
+        'probabilities/label2',
+        'log_probabilities',
+        'log_probabilities/label1',
+        'log_probabilities/label2',
+        'predictions',
+        'predictions/label1',
+        'predictions/label2',
+    ], model.predictions.keys())
 
   @parameterized.named_parameters(
       {
@@ -514,65 +447,25 @@ class TaskManagerTest(parameterized.TestCase, tf.test.TestCase):
           'weight_is_a_feature': True
       })
   def test_weight_feature(self, is_multitask, weight_is_a_feature):
-    # Force graph mode
-    with tf.compat.v1.Graph().as_default():
-      learning_rate_spec = {'learning_rate': 0.001, 'gradient_max_norm': 3}
-      spec = phoenix_spec_pb2.PhoenixSpec(
-          problem_type=phoenix_spec_pb2.PhoenixSpec.DNN)
-      labels = tf.ones([20], dtype=tf.int32)
-      if is_multitask:
-        text_format.Merge(
-            """
-            multi_task_spec {
-              label_name: "label1"
-              number_of_classes: 10
-              weight_feature_name: "weight1"
-              weight_is_a_feature: %s
-            }
-            multi_task_spec {
-              label_name: "label2"
-              number_of_classes: 10
-              weight_feature_name: "weight2"
-              weight_is_a_feature: %s
-            }
-        """ % (str(weight_is_a_feature), str(weight_is_a_feature)), spec)
-        labels = {
-            'label1': tf.ones([20], dtype=tf.int32),
-            'label2': tf.ones([20], dtype=tf.int32)
-        }
-
-      weights = {
-          'weight1': tf.constant([2] * 20),
-          'weight2': tf.constant([3] * 20)
+    learning_rate_spec = {'learning_rate': 0.001, 'gradient_max_norm': 3}
+    spec = phoenix_spec_pb2.PhoenixSpec(
+        problem_type=phoenix_spec_pb2.PhoenixSpec.DNN)
+    labels = tf.ones([2], dtype=tf.int32)
+    if is_multitask:
+      spec.CopyFrom(self._weighted_multitask_specs[weight_is_a_feature])
+      labels = {
+          'label1': tf.ones([2], dtype=tf.int32),
+          'label2': tf.ones([2], dtype=tf.int32)
       }
-      features = {'x': tf.zeros([10, 10])}
-      if weight_is_a_feature:
-        features.update(weights)
-      elif isinstance(labels, dict):
-        labels.update(weights)
-      task_manager_instance = task_manager.TaskManager(
-          spec,
-          logits_dimension=None,
-          loss_fn=loss_fns.make_multi_class_loss_fn(),
-          head=None)
-      logits = tf.keras.layers.Dense(10)(tf.zeros([20, 10]))
-      logits_spec = architecture_utils.LogitsSpec(logits=logits)
-      fake_tower = collections.namedtuple('fake_tower',
-                                          ['logits_spec', 'previous_model_dir'])
-      towers = {'search_generator': [fake_tower(logits_spec, None)]}
-
-      _ = task_manager_instance.create_model_spec(
-          features=features,
-          params=hp.HParams(optimizer='sgd'),
-          learning_rate_spec=learning_rate_spec,
-          towers=towers,
-          labels=labels,
-          model_directory=self.get_temp_dir(),
-          mode=tf.estimator.ModeKeys.TRAIN,
-          my_id=1,
-          trial_mode=trial_utils.TrialMode.NO_PRIOR,
-          use_tpu=False,
-          predictions_fn=_default_predictions_fn)
+
+    weights = {'weight1': tf.fill([2], 2), 'weight2': tf.fill([2], 3)}
+    features = {'x': tf.zeros([2, 2])}
+    if weight_is_a_feature:
+      features.update(weights)
+    elif isinstance(labels, dict):
+      labels.update(weights)
+    _ = self._create_model_spec(
+        spec, learning_rate_spec, labels=labels, features=features)
 
   @parameterized.named_parameters(
       {
@@ -584,194 +477,98 @@ class TaskManagerTest(parameterized.TestCase, tf.test.TestCase):
       })
   def test_wrong_dict_weight_feature(self, weight_is_a_feature):
     learning_rate_spec = {'learning_rate': 0.001, 'gradient_max_norm': 3}
-    spec = phoenix_spec_pb2.PhoenixSpec(
-        problem_type=phoenix_spec_pb2.PhoenixSpec.DNN)
-    text_format.Merge(
-        """
-        multi_task_spec {
-          label_name: "label1"
-          number_of_classes: 10
-          weight_feature_name: "weight1"
-          weight_is_a_feature: %s
-        }
-        multi_task_spec {
-          label_name: "label2"
-          number_of_classes: 10
-          weight_feature_name: "weight2"
-          weight_is_a_feature: %s
-        }
-    """ % (str(weight_is_a_feature), str(weight_is_a_feature)), spec)
+    spec = phoenix_spec_pb2.PhoenixSpec()
+    spec.CopyFrom(self._weighted_multitask_specs[weight_is_a_feature])
     labels = {
-        'label1': tf.ones([20], dtype=tf.int32),
-        'label2': tf.ones([20], dtype=tf.int32),
+        'label1': tf.ones([2], dtype=tf.int32),
+        'label2': tf.ones([2], dtype=tf.int32),
     }
     # Fix the size of the dict labels to bypass the assertion.
     if not weight_is_a_feature:
       labels.update({
-          'not_used': tf.ones([20], dtype=tf.int32),
-          'not_used2': tf.ones([20], dtype=tf.int32)
+          'not_used': tf.ones([2], dtype=tf.int32),
+          'not_used2': tf.ones([2], dtype=tf.int32)
       })
 
-    weights = {
-        'weight1': tf.constant([2] * 20),
-        'weight2': tf.constant([3] * 20)
-    }
-    features = {'x': tf.zeros([10, 10])}
+    weights = {'weight1': tf.fill([2], 2), 'weight2': tf.fill([2], 3)}
+    features = {'x': tf.zeros([2, 2])}
     if not weight_is_a_feature:
       features.update(weights)
-    task_manager_instance = task_manager.TaskManager(
-        spec,
-        logits_dimension=None,
-        loss_fn=loss_fns.make_multi_class_loss_fn(),
-        head=None)
-    logits = tf.keras.layers.Dense(10)(tf.zeros([20, 10]))
-    logits_spec = architecture_utils.LogitsSpec(logits=logits)
-    fake_tower = collections.namedtuple('fake_tower',
-                                        ['logits_spec', 'previous_model_dir'])
-    towers = {'search_generator': [fake_tower(logits_spec, None)]}
 
     with self.assertRaises(KeyError):
-      _ = task_manager_instance.create_model_spec(
-          features=features,
-          params=hp.HParams(optimizer='sgd'),
-          learning_rate_spec=learning_rate_spec,
-          towers=towers,
-          labels=labels,
-          trial_mode=trial_utils.TrialMode.NO_PRIOR,
-          model_directory=self.get_temp_dir(),
-          mode=tf.estimator.ModeKeys.TRAIN,
-          my_id=1,
-          use_tpu=False,
-          predictions_fn=_default_predictions_fn)
+      _ = self._create_model_spec(
+          spec, learning_rate_spec, labels=labels, features=features)
 
   def test_architecture(self):
-    # Force graph mode
-    with tf.compat.v1.Graph().as_default():
-      learning_rate_spec = {'learning_rate': 0.001, 'gradient_max_norm': 3}
-      spec = phoenix_spec_pb2.PhoenixSpec(
-          problem_type=phoenix_spec_pb2.PhoenixSpec.CNN)
-      text_format.Merge(
-          """
-          multi_task_spec {
-            label_name: "label1"
-            number_of_classes: 10
-            architecture: "FIXED_OUTPUT_FULLY_CONNECTED_128"
-          }
-          multi_task_spec {
-            label_name: "label2"
-            number_of_classes: 10
-            architecture: "FIXED_OUTPUT_FULLY_CONNECTED_256"
-            architecture: "FIXED_OUTPUT_FULLY_CONNECTED_512"
-          }
-      """, spec)
-      task_manager_instance = task_manager.TaskManager(
-          spec,
-          logits_dimension=None,
-          loss_fn=loss_fns.make_multi_class_loss_fn(),
-          head=None)
-      logits = tf.keras.layers.Dense(10)(tf.zeros([20, 10]))
-      logits_spec = architecture_utils.LogitsSpec(logits=logits)
-      fake_tower = collections.namedtuple('fake_tower',
-                                          ['logits_spec', 'previous_model_dir'])
-      towers = {'search_generator': [fake_tower(logits_spec, None)]}
-      features = {'x': tf.zeros([10, 10])}
-      model = task_manager_instance.create_model_spec(
-          features=features,
-          params=hp.HParams(optimizer='sgd'),
-          learning_rate_spec=learning_rate_spec,
-          towers=towers,
-          labels={
-              'label1': tf.ones([20], dtype=tf.int32),
-              'label2': tf.ones([20], dtype=tf.int32)
-          },
-          model_directory=self.get_temp_dir(),
-          mode=tf.estimator.ModeKeys.TRAIN,
-          my_id=1,
-          trial_mode=trial_utils.TrialMode.NO_PRIOR,
-          use_tpu=False,
-          predictions_fn=_default_predictions_fn)
-      # pylint: disable=g-complex-comprehension
-      self.assertNotEmpty([
-          node.name
-          for node in tf.compat.v1.get_default_graph().as_graph_def().node
-          if 'label1_0_search_generator/1_FIXED_OUTPUT_FULLY_CONNECTED_128' in
-          node.name
-      ])
-      self.assertNotEmpty([
-          node.name
-          for node in tf.compat.v1.get_default_graph().as_graph_def().node
-          if 'label2_0_search_generator/1_FIXED_OUTPUT_FULLY_CONNECTED_256' in
-          node.name
-      ])
-      self.assertNotEmpty([
-          node.name
-          for node in tf.compat.v1.get_default_graph().as_graph_def().node
-          if 'label2_0_search_generator/2_FIXED_OUTPUT_FULLY_CONNECTED_512' in
-          node.name
-      ])
-      # pylint: enable=g-complex-comprehension
-      self.assertLen(model.predictions, 3 * (1 + 2))
-      self.assertIn('probabilities', model.predictions)
-      self.assertIn('log_probabilities', model.predictions)
-      self.assertIn('predictions', model.predictions)
+    learning_rate_spec = {'learning_rate': 0.001, 'gradient_max_norm': 3}
+    spec = phoenix_spec_pb2.PhoenixSpec(
+        problem_type=phoenix_spec_pb2.PhoenixSpec.CNN)
+    text_format.Merge(
+        """
+        multi_task_spec {
+          label_name: "label1"
+          number_of_classes: 2
+          architecture: "FIXED_OUTPUT_FULLY_CONNECTED_128"
+        }
+        multi_task_spec {
+          label_name: "label2"
+          number_of_classes: 2
+          architecture: "FIXED_OUTPUT_FULLY_CONNECTED_256"
+          architecture: "FIXED_OUTPUT_FULLY_CONNECTED_512"
+        }
+    """, spec)
+    model = self._create_model_spec(
+        spec,
+        learning_rate_spec,
+        labels={
+            'label1': tf.ones([2], dtype=tf.int32),
+            'label2': tf.ones([2], dtype=tf.int32)
+        })
+    node_names = _graph_node_names()
+    self._assert_node_in(
+        'label1_0_search_generator/1_FIXED_OUTPUT_FULLY_CONNECTED_128',
+        node_names)
+    self._assert_node_in(
+        'label2_0_search_generator/1_FIXED_OUTPUT_FULLY_CONNECTED_256',
+        node_names)
+    self._assert_node_in(
+        'label2_0_search_generator/2_FIXED_OUTPUT_FULLY_CONNECTED_512',
+        node_names)
+    self.assertLen(model.predictions, 3 * (1 + 2))
+    self.assertIn('probabilities', model.predictions)
+    self.assertIn('log_probabilities', model.predictions)
+    self.assertIn('predictions', model.predictions)
 
   def test_projection(self):
-    # Force graph mode
-    with tf.compat.v1.Graph().as_default():
-      learning_rate_spec = {'learning_rate': 0.001, 'gradient_max_norm': 3}
-      spec = phoenix_spec_pb2.PhoenixSpec(
-          problem_type=phoenix_spec_pb2.PhoenixSpec.DNN)
-      text_format.Merge(
-          """
-          multi_task_spec {
-            label_name: "label1"
-            number_of_classes: 10
-          }
-          multi_task_spec {
-            label_name: "label2"
-            number_of_classes: 5
-          }
-      """, spec)
-      task_manager_instance = task_manager.TaskManager(
-          spec,
-          logits_dimension=None,
-          loss_fn=loss_fns.make_multi_class_loss_fn(),
-          head=None)
-      logits = tf.keras.layers.Dense(10)(tf.zeros([20, 10]))
-      logits_spec = architecture_utils.LogitsSpec(logits=logits)
-      fake_tower = collections.namedtuple('fake_tower',
-                                          ['logits_spec', 'previous_model_dir'])
-      towers = {'search_generator': [fake_tower(logits_spec, None)]}
-      features = {'x': tf.zeros([10, 10])}
-      model = task_manager_instance.create_model_spec(
-          features=features,
-          params=hp.HParams(optimizer='sgd'),
-          learning_rate_spec=learning_rate_spec,
-          towers=towers,
-          labels={
-              'label1': tf.ones([20], dtype=tf.int32),
-              'label2': tf.ones([20], dtype=tf.int32)
-          },
-          my_id=1,
-          model_directory=self.get_temp_dir(),
-          mode=tf.estimator.ModeKeys.TRAIN,
-          trial_mode=trial_utils.TrialMode.NO_PRIOR,
-          use_tpu=False,
-          predictions_fn=_default_predictions_fn)
-      self.assertEmpty([
-          node.name
-          for node in tf.compat.v1.get_default_graph().as_graph_def().node
-          if 'label1_0_search_generator/maybe_proj' in node.name
-      ])
-      self.assertNotEmpty([
-          node.name
-          for node in tf.compat.v1.get_default_graph().as_graph_def().node
-          if 'label2_0_search_generator/maybe_proj' in node.name
-      ])
-      self.assertLen(model.predictions, 3 * (1 + 2))
-      self.assertIn('probabilities', model.predictions)
-      self.assertIn('log_probabilities', model.predictions)
-      self.assertIn('predictions', model.predictions)
+    learning_rate_spec = {'learning_rate': 0.001, 'gradient_max_norm': 3}
+    spec = phoenix_spec_pb2.PhoenixSpec(
+        problem_type=phoenix_spec_pb2.PhoenixSpec.DNN)
+    text_format.Merge(
+        """
+        multi_task_spec {
+          label_name: "label1"
+          number_of_classes: 2
+        }
+        multi_task_spec {
+          label_name: "label2"
+          number_of_classes: 5
+        }
+    """, spec)
+    model = self._create_model_spec(
+        spec,
+        learning_rate_spec,
+        labels={
+            'label1': tf.ones([2], dtype=tf.int32),
+            'label2': tf.ones([2], dtype=tf.int32)
+        })
+    node_names = _graph_node_names()
+    self._assert_node_not_in('label1_0_search_generator/maybe_proj',
+                             node_names)
+    self._assert_node_in('label2_0_search_generator/maybe_proj', node_names)
+    self.assertLen(model.predictions, 3 * (1 + 2))
+    self.assertIn('probabilities', model.predictions)
+    self.assertIn('log_probabilities', model.predictions)
+    self.assertIn('predictions', model.predictions)
 
   def test_get_task(self):
     spec = phoenix_spec_pb2.PhoenixSpec(
@@ -795,7 +592,7 @@ class TaskManagerTest(parameterized.TestCase, tf.test.TestCase):
         logits_dimesnion=10,
         is_frozen=False,
         hparams={},
-        model_directory='/tmp/',
+        model_directory=self._model_directory,
         generator_name='search_generator',
         previous_tower_name=None,
         previous_model_dir=None)
@@ -808,12 +605,12 @@ class TaskManagerTest(parameterized.TestCase, tf.test.TestCase):
         logits_dimesnion=10,
         is_frozen=False,
         hparams={},
-        model_directory='/tmp/',
+        model_directory=self._model_directory,
         generator_name='prior_generator',
         previous_tower_name='label1_0_search_generator',
         previous_model_dir='/tmp/oldmodel')
     self.assertEqual(imported_tower.previous_model_dir, '/tmp/oldmodel')
 
 if __name__ == '__main__':
-  tf.enable_v2_behavior()
+  tf.compat.v1.enable_v2_behavior()
   tf.test.main()